@@ -84,6 +84,9 @@ MIN_LR = 0.001                     # Minimum learning rate
 # Data loading configuration
 NUM_WORKERS = 4                    # Disable worker threads for data loading
 PIN_MEMORY = True                 # Disable pin memory to save GPU memory
+PREFETCH_FACTOR = 4                # Batches prefetched per worker (only used if NUM_WORKERS > 0)
+PERSISTENT_WORKERS = True          # Keep worker processes alive between epochs/rounds
+USE_NUMBA = False                  # JIT the label skew split with numba (first call compiles; NumPy is faster for typical splits)
 
 # ======================================
 # MODEL AND DATASET CONFIGURATION
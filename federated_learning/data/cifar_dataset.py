@@ -5,6 +5,22 @@ from torchvision import transforms, datasets
 import numpy as np
 from PIL import Image
 from federated_learning.config.config import *
+from federated_learning.data.in_memory_dataset import InMemoryTensorDataset
+
+CIFAR10_MEAN = (0.4914, 0.4822, 0.4465)
+CIFAR10_STD = (0.2023, 0.1994, 0.2010)
+
+def _cifar_to_in_memory(cifar_dataset, augment=False):
+    """
+    Wrap a torchvision CIFAR-10 dataset's raw uint8 data in an InMemoryTensorDataset.
+    
+    Equivalent to ToTensor + Normalize(CIFAR10_MEAN, CIFAR10_STD), preceded by
+    RandomCrop(32, padding=4) + RandomHorizontalFlip() if augment is True.
+    """
+    # (N, H, W, C) numpy -> (N, C, H, W) tensor in shared memory for DataLoader workers
+    imgs_u8 = torch.from_numpy(cifar_dataset.data).permute(0, 3, 1, 2).contiguous().share_memory_()
+    labels = torch.as_tensor(cifar_dataset.targets, dtype=torch.long).share_memory_()
+    return InMemoryTensorDataset(imgs_u8, labels, CIFAR10_MEAN, CIFAR10_STD, augment=augment)
 
 def load_cifar10_dataset():
     """
@@ -16,46 +32,34 @@ def load_cifar10_dataset():
         num_classes: Number of classes
         input_channels: Number of input channels
     """
-    # Define transforms with data augmentation for training
-    train_transform = transforms.Compose([
-        transforms.RandomCrop(32, padding=4),
-        transforms.RandomHorizontalFlip(),
-        transforms.ToTensor(),
-        transforms.Normalize((0.4914, 0.4822, 0.4465), (0.2023, 0.1994, 0.2010))
-    ])
-    
-    # Simpler transforms for testing
-    test_transform = transforms.Compose([
-        transforms.ToTensor(),
-        transforms.Normalize((0.4914, 0.4822, 0.4465), (0.2023, 0.1994, 0.2010))
-    ])
-    
     # Load datasets
     try:
         # Create directory if it doesn't exist
         os.makedirs(CIFAR_DATA_ROOT, exist_ok=True)
         
-        # Load training data
-        train_dataset = datasets.CIFAR10(
+        # Load raw training and test data (no per-sample transforms)
+        raw_train = datasets.CIFAR10(
             root=CIFAR_DATA_ROOT,
             train=True,
-            download=True,
-            transform=train_transform
+            download=True
         )
         
-        # Load test data
-        test_dataset = datasets.CIFAR10(
+        raw_test = datasets.CIFAR10(
             root=CIFAR_DATA_ROOT,
             train=False,
-            download=True,
-            transform=test_transform
+            download=True
         )
         
+        # Keep the images in memory as uint8; normalization (and random crop /
+        # horizontal flip augmentation for training) is applied per batch
+        train_dataset = _cifar_to_in_memory(raw_train, augment=True)
+        test_dataset = _cifar_to_in_memory(raw_test, augment=False)
+        
         num_classes = 10  # CIFAR-10 has 10 classes
         input_channels = 3  # RGB images
         
         print(f"CIFAR-10 dataset loaded: {len(train_dataset)} training samples, {len(test_dataset)} test samples")
-        print(f"Classes: {train_dataset.classes}")
+        print(f"Classes: {raw_train.classes}")
         
         return train_dataset, test_dataset, num_classes, input_channels
     
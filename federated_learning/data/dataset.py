@@ -1,13 +1,125 @@
 import torch
 from torch.utils.data import Dataset, DataLoader
+from torch.utils.data.dataloader import default_collate
 from torchvision import datasets, transforms
 import random
+import importlib.util
 import numpy as np
 from federated_learning.config.config import *
 from federated_learning.data.alzheimer_dataset import load_alzheimer_dataset, download_alzheimer_dataset
 from federated_learning.data.cifar_dataset import load_cifar10_dataset
+from federated_learning.data.in_memory_dataset import InMemoryTensorDataset
 
-class LabelFlippingDataset(Dataset):
+# Optional: numba JIT for the per-sample loop in split_dataset_non_iid. Only
+# used if USE_NUMBA is set; numba is imported on first use since importing it
+# is slow
+HAS_NUMBA = importlib.util.find_spec("numba") is not None
+
+# Share tensors with DataLoader workers through the file system instead of
+# file descriptors to avoid shared memory exhaustion / bus errors
+torch.multiprocessing.set_sharing_strategy('file_system')
+
+MNIST_MEAN = (0.1307,)
+MNIST_STD = (0.3081,)
+# A white pixel in MNIST-normalized space, used as the default backdoor trigger value
+MNIST_WHITE = (1.0 - MNIST_MEAN[0]) / MNIST_STD[0]
+
+def _mnist_to_in_memory(mnist_dataset):
+    """
+    Wrap a torchvision MNIST dataset's raw uint8 data in an InMemoryTensorDataset.
+    
+    Equivalent to applying ToTensor + Normalize(MNIST_MEAN, MNIST_STD) to every sample.
+    """
+    # Place the tensors in shared memory so DataLoader workers map them instead of copying
+    imgs_u8 = mnist_dataset.data.unsqueeze(1).contiguous().share_memory_()
+    labels = mnist_dataset.targets.clone().share_memory_()
+    return InMemoryTensorDataset(imgs_u8, labels, MNIST_MEAN, MNIST_STD)
+
+def _fetch_batch(dataset, idxs):
+    """
+    Fetch a batch of samples from a dataset.
+    
+    Uses the dataset's own __getitems__ when available, otherwise falls back
+    to per-index access.
+    
+    Returns:
+        datas: List of data samples
+        targets: LongTensor of targets
+    """
+    if hasattr(dataset, '__getitems__'):
+        samples = dataset.__getitems__(idxs)
+    else:
+        samples = [dataset[idx] for idx in idxs]
+    datas = [data for data, _ in samples]
+    targets = torch.as_tensor([int(target) for _, target in samples], dtype=torch.long)
+    return datas, targets
+
+def _build_alias_tables(prob_map):
+    """
+    Build Walker alias tables for each row of a probability matrix.
+    
+    Args:
+        prob_map: Array of shape (num_rows, num_outcomes); each row sums to 1
+        
+    Returns:
+        prob: Acceptance probabilities, shape (num_rows, num_outcomes)
+        alias: Alias outcomes, shape (num_rows, num_outcomes)
+    """
+    num_rows, n = prob_map.shape
+    prob = np.ones((num_rows, n), dtype=np.float64)
+    alias = np.tile(np.arange(n, dtype=np.int64), (num_rows, 1))
+    for row in range(num_rows):
+        scaled = prob_map[row].astype(np.float64) * n
+        small = [i for i in range(n) if scaled[i] < 1.0]
+        large = [i for i in range(n) if scaled[i] >= 1.0]
+        while small and large:
+            s, l = small.pop(), large.pop()
+            prob[row, s] = scaled[s]
+            alias[row, s] = l
+            scaled[l] = scaled[l] + scaled[s] - 1.0
+            if scaled[l] < 1.0:
+                small.append(l)
+            else:
+                large.append(l)
+        # Leftovers are 1.0 up to floating point error
+        for i in small + large:
+            prob[row, i] = 1.0
+    return prob, alias
+
+class LabelRemapDataset(Dataset):
+    """
+    Base dataset wrapper for attacks that only change labels through a lookup table.
+    
+    With a 1D remap of shape (num_classes,), label l becomes remap[l].
+    With a 2D remap of shape (num_rows, num_classes) and an index_map of shape
+    (len(dataset),), the label of sample i becomes remap[index_map[i], l].
+    Both tables are kept in shared memory for DataLoader workers, and
+    __getitems__ remaps a whole batch with one gather.
+    """
+    def __init__(self, dataset, remap, index_map=None):
+        self.dataset = dataset
+        self.remap = remap.share_memory_()
+        self.index_map = index_map.share_memory_() if index_map is not None else None
+
+    def __len__(self):
+        return len(self.dataset)
+
+    def __getitem__(self, idx):
+        data, target = self.dataset[idx]
+        if self.index_map is None:
+            return data, int(self.remap[target])
+        return data, int(self.remap[self.index_map[idx], target])
+
+    def __getitems__(self, idxs):
+        # Batched fetch used by the DataLoader: remap all targets with one gather
+        datas, targets = _fetch_batch(self.dataset, idxs)
+        if self.index_map is None:
+            remapped = self.remap.index_select(0, targets)
+        else:
+            remapped = self.remap[self.index_map[torch.as_tensor(idxs, dtype=torch.long)], targets]
+        return list(zip(datas, remapped.tolist()))
+
+class LabelFlippingDataset(LabelRemapDataset):
     """
     Dataset wrapper that implements label flipping attack.
     Flips each label l to (num_classes - l - 1).
@@ -16,16 +128,40 @@ class LabelFlippingDataset(Dataset):
     0 -> 9, 1 -> 8, 2 -> 7, etc.
     """
     def __init__(self, dataset, num_classes):
-        self.dataset = dataset
+        super().__init__(dataset, torch.arange(num_classes - 1, -1, -1))
         self.num_classes = num_classes
+        self.flip_table = self.remap
 
-    def __len__(self):
-        return len(self.dataset)
+def _find_normalization(dataset):
+    """
+    Find the per-channel (mean, std) normalization applied by a dataset.
+    
+    Looks for `mean`/`std` attributes (InMemoryTensorDataset) or a Normalize
+    step in the dataset's transform, unwrapping `.dataset` wrappers (Subsets,
+    attack datasets) along the way.
+    
+    Returns:
+        (mean, std) tuple, or None if no normalization is found
+    """
+    while dataset is not None:
+        if hasattr(dataset, 'mean') and hasattr(dataset, 'std'):
+            return dataset.mean, dataset.std
+        transform = getattr(dataset, 'transform', None)
+        for t in getattr(transform, 'transforms', [transform]):
+            if isinstance(t, transforms.Normalize):
+                return t.mean, t.std
+        dataset = getattr(dataset, 'dataset', None)
+    return None
 
-    def __getitem__(self, idx):
-        data, target = self.dataset[idx]
-        flipped_target = self.num_classes - target - 1
-        return data, flipped_target
+def _white_value_tensor(value):
+    """Shape a per-channel trigger value as (C, 1, 1) so it broadcasts over image pixels."""
+    return torch.as_tensor(value, dtype=torch.float32).view(-1, 1, 1)
+
+def _white_value(mean, std):
+    """Per-channel value of a white pixel after Normalize(mean, std), shaped (C, 1, 1)."""
+    mean = torch.as_tensor(mean, dtype=torch.float32)
+    std = torch.as_tensor(std, dtype=torch.float32)
+    return _white_value_tensor((1.0 - mean) / std)
 
 class BackdoorDataset(Dataset):
     """
@@ -34,32 +170,45 @@ class BackdoorDataset(Dataset):
     
     This creates poisoned examples that the model will associate with the target label.
     """
-    def __init__(self, dataset, num_classes, target_label=0):
+    def __init__(self, dataset, num_classes, target_label=0, trigger_value=None, trigger_size=4):
         self.dataset = dataset
         self.num_classes = num_classes
         self.target_label = target_label
-        self.trigger = self.create_trigger()
-
-    def create_trigger(self):
-        """
-        Creates a trigger pattern to add to images.
-        Currently creates a small white square in the bottom right corner.
-        """
-        trigger = torch.zeros((1, 28, 28))
-        trigger[:, 24:, 24:] = 1.0
-        return trigger
+        # Trigger pixel value in normalized space: by default a white pixel under
+        # the wrapped dataset's (per-channel) normalization
+        if trigger_value is None:
+            normalization = _find_normalization(dataset)
+            if normalization is None:
+                print("Warning: Could not determine dataset normalization for backdoor trigger. "
+                      "Using MNIST white value.")
+                trigger_value = MNIST_WHITE
+            else:
+                trigger_value = _white_value(*normalization)
+        elif not isinstance(trigger_value, (int, float)):
+            trigger_value = _white_value_tensor(trigger_value)
+        self.trigger_value = trigger_value
+        # Place the trigger (a small white square) in the bottom right corner;
+        # negative offsets fit any image shape without reading a sample
+        self.trigger_slices = (slice(None), slice(-trigger_size, None), slice(-trigger_size, None))
 
     def __len__(self):
         return len(self.dataset)
 
     def __getitem__(self, idx):
         data, _ = self.dataset[idx]  # Original target is ignored
-        # Add trigger to the image
-        data = data + self.trigger
-        data = torch.clamp(data, 0, 1)  # Ensure pixel values stay in valid range
+        # Stamp the trigger without touching the rest of the image
+        data = data.clone()
+        data[self.trigger_slices] = self.trigger_value
         # Set to target label
         return data, self.target_label
 
+    def __getitems__(self, idxs):
+        # Stamp the trigger on the whole batch with a single write
+        datas, _ = _fetch_batch(self.dataset, idxs)
+        batch = torch.stack(datas)
+        batch[(slice(None),) + self.trigger_slices] = self.trigger_value
+        return [(data, self.target_label) for data in batch]
+
 class AdaptiveAttackDataset(Dataset):
     """
     Dataset wrapper for adaptive attacks.
@@ -78,7 +227,7 @@ class AdaptiveAttackDataset(Dataset):
         # Can implement sophisticated adaptive data poisoning here
         return data, target
 
-class MinMaxAttackDataset(Dataset):
+class MinMaxAttackDataset(LabelRemapDataset):
     """
     Dataset wrapper that implements the min-max attack as described in FLTrust paper.
     
@@ -87,20 +236,11 @@ class MinMaxAttackDataset(Dataset):
     for each true class.
     """
     def __init__(self, dataset, num_classes):
-        self.dataset = dataset
-        self.num_classes = num_classes
         # Create a confusion matrix to determine most confusing classes
         # For simplicity, we use a predefined pattern: target = (original + 1) % num_classes
-        self.confusion_map = [(i + 1) % num_classes for i in range(num_classes)]
-
-    def __len__(self):
-        return len(self.dataset)
-
-    def __getitem__(self, idx):
-        data, target = self.dataset[idx]
-        # Map to the confusing class
-        confused_target = self.confusion_map[target]
-        return data, confused_target
+        super().__init__(dataset, (torch.arange(num_classes) + 1) % num_classes)
+        self.num_classes = num_classes
+        self.confusion_map = self.remap
 
 class MinSumAttackDataset(Dataset):
     """
@@ -126,17 +266,37 @@ class MinSumAttackDataset(Dataset):
                     self.prob_map[i, j] = 1.0 / distance if distance > 0 else 0.1
             # Normalize to create a probability distribution
             self.prob_map[i] = self.prob_map[i] / self.prob_map[i].sum()
+        
+        self.prob_map.share_memory_()
+        
+        # Precompute Walker alias tables so each draw is O(1) with two lookups
+        alias_prob, alias = _build_alias_tables(self.prob_map.numpy())
+        self.alias_prob = torch.from_numpy(alias_prob).share_memory_()
+        self.alias = torch.from_numpy(alias).share_memory_()
+        # numpy views of the shared tables for fast scalar lookups, created lazily
+        # in each process so that workers receive the shared tensors, not copies
+        self._alias_views = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_alias_views'] = None
+        return state
 
     def __len__(self):
         return len(self.dataset)
 
     def __getitem__(self, idx):
         data, target = self.dataset[idx]
-        # Sample from the probability distribution for this class
-        new_target = torch.multinomial(self.prob_map[target], 1).item()
+        if self._alias_views is None:
+            self._alias_views = (self.alias_prob.numpy(), self.alias.numpy())
+        alias_prob, alias = self._alias_views
+        # Sample from the probability distribution for this class (alias method)
+        u = random.random() * self.num_classes
+        k = int(u)
+        new_target = k if u - k < alias_prob[target, k] else int(alias[target, k])
         return data, new_target
 
-class AlternatingAttackDataset(Dataset):
+class AlternatingAttackDataset(LabelRemapDataset):
     """
     Dataset wrapper that implements the alternating attack.
     
@@ -144,26 +304,19 @@ class AlternatingAttackDataset(Dataset):
     that's difficult to detect but creates systematic bias.
     """
     def __init__(self, dataset, num_classes):
-        self.dataset = dataset
-        self.num_classes = num_classes
         # Create alternating patterns for different samples
-        self.alternating_offset = np.random.randint(0, num_classes, size=len(dataset))
-
-    def __len__(self):
-        return len(self.dataset)
-
-    def __getitem__(self, idx):
-        data, target = self.dataset[idx]
-        # Use sample index to determine if we should alter the label
-        if idx % 2 == 0:
-            # Even indices: use offset to create deterministic but varied pattern
-            altered_target = (target + self.alternating_offset[idx]) % self.num_classes
-            return data, altered_target
-        else:
-            # Odd indices: keep original
-            return data, target
+        self.alternating_offset = torch.from_numpy(np.random.randint(0, num_classes, size=len(dataset))).share_memory_()
+        # Per-index shift: even indices are shifted by their offset to create a
+        # deterministic but varied pattern, odd indices keep the original (shift 0)
+        delta = np.where(np.arange(len(dataset)) % 2 == 0, self.alternating_offset.numpy(), 0).astype(np.int64)
+        # shift_table[d, l] = (l + d) % num_classes
+        classes = torch.arange(num_classes)
+        shift_table = (classes[:, None] + classes[None, :]) % num_classes
+        super().__init__(dataset, shift_table, torch.from_numpy(delta))
+        self.num_classes = num_classes
+        self.delta = self.index_map
 
-class TargetedAttackDataset(Dataset):
+class TargetedAttackDataset(LabelRemapDataset):
     """
     Dataset wrapper that implements a targeted attack.
     
@@ -171,22 +324,15 @@ class TargetedAttackDataset(Dataset):
     and makes targeted modifications to mislead the model specifically on that subset.
     """
     def __init__(self, dataset, num_classes, target_class=0, target_output=1):
-        self.dataset = dataset
+        # Only samples from the target class are modified
+        remap = torch.arange(num_classes)
+        remap[target_class] = target_output
+        super().__init__(dataset, remap)
         self.num_classes = num_classes
         self.target_class = target_class  # The class to attack
         self.target_output = target_output  # The incorrect output to produce
 
-    def __len__(self):
-        return len(self.dataset)
-
-    def __getitem__(self, idx):
-        data, target = self.dataset[idx]
-        # Only modify samples from the target class
-        if target == self.target_class:
-            return data, self.target_output
-        return data, target
-
-class GradientInversionAttackDataset(Dataset):
+class GradientInversionAttackDataset(LabelRemapDataset):
     """
     Dataset wrapper that implements a gradient inversion attack.
     
@@ -195,36 +341,152 @@ class GradientInversionAttackDataset(Dataset):
     parts of the model, making detection more difficult.
     """
     def __init__(self, dataset, num_classes):
-        self.dataset = dataset
-        self.num_classes = num_classes
         # Create patterns for different sections of the dataset
         dataset_size = len(dataset)
         quarter_size = dataset_size // 4
         
-        # Different strategies for different quarters
-        self.strategies = [
-            lambda x: (x + 1) % num_classes,                  # First quarter: simple shift
-            lambda x: (x + num_classes // 2) % num_classes,   # Second quarter: maximum distance
-            lambda x: x,                                      # Third quarter: unchanged
-            lambda x: num_classes - x - 1                     # Fourth quarter: inversion
-        ]
+        # Different strategies for different quarters, stored as a
+        # (quarter, class) -> modified class lookup table
+        classes = np.arange(num_classes)
+        lut = np.empty((4, num_classes), dtype=np.int64)
+        lut[0] = (classes + 1) % num_classes                  # First quarter: simple shift
+        lut[1] = (classes + num_classes // 2) % num_classes   # Second quarter: maximum distance
+        lut[2] = classes                                      # Third quarter: unchanged
+        lut[3] = num_classes - classes - 1                    # Fourth quarter: inversion
         
         # Map each index to its quarter
-        self.quarter_map = np.zeros(dataset_size, dtype=int)
+        quarter_map = torch.zeros(dataset_size, dtype=torch.long)
         for i in range(4):
             start = i * quarter_size
             end = (i + 1) * quarter_size if i < 3 else dataset_size
-            self.quarter_map[start:end] = i
+            quarter_map[start:end] = i
+        
+        super().__init__(dataset, torch.from_numpy(lut), quarter_map)
+        self.num_classes = num_classes
+        self.lut = self.remap
+        self.quarter_map = self.index_map
 
-    def __len__(self):
-        return len(self.dataset)
+def make_loader(dataset, batch_size, shuffle, num_workers=None, collate_fn=None):
+    """
+    Create a DataLoader with the data loading settings from config.
+    
+    Worker processes are kept alive between epochs (PERSISTENT_WORKERS) so they
+    are not re-spawned for every pass over the data, and each worker prefetches
+    PREFETCH_FACTOR batches ahead.
+    
+    Args:
+        dataset: The dataset to load
+        batch_size: Batch size
+        shuffle: Whether to shuffle the data every epoch
+        num_workers: Number of worker processes
+                     If None, uses NUM_WORKERS from config
+        collate_fn: Optional collate function (e.g. from make_attack_collate)
+        
+    Returns:
+        A DataLoader over the dataset
+    """
+    if num_workers is None:
+        num_workers = NUM_WORKERS
+    
+    loader_kwargs = {}
+    if num_workers > 0:
+        # These options are only valid with worker processes
+        loader_kwargs['persistent_workers'] = PERSISTENT_WORKERS
+        loader_kwargs['prefetch_factor'] = PREFETCH_FACTOR
+    
+    return DataLoader(
+        dataset,
+        batch_size=batch_size,
+        shuffle=shuffle,
+        num_workers=num_workers,
+        pin_memory=PIN_MEMORY and torch.cuda.is_available(),
+        collate_fn=collate_fn,
+        **loader_kwargs
+    )
 
-    def __getitem__(self, idx):
-        data, target = self.dataset[idx]
-        # Apply the strategy for this sample's quarter
-        quarter = self.quarter_map[idx]
-        modified_target = self.strategies[quarter](target)
-        return data, modified_target
+def make_attack_collate(attack_type, num_classes, target_label=0, trigger_value=None,
+                        mean=None, std=None, trigger_size=4, target_class=0, target_output=1):
+    """
+    Create a DataLoader collate_fn that applies a data poisoning attack to whole batches.
+    
+    This is a batch-level alternative to the per-sample attack dataset wrappers:
+    the batch is collated first and the attack is applied once to the
+    (B, C, H, W) data tensor and (B,) target tensor.
+    
+    Args:
+        attack_type: Attack type ('label_flipping', 'backdoor', 'min_max', 'targeted')
+        num_classes: Number of classes in the dataset
+        target_label: Label assigned to backdoored samples
+        trigger_value: Backdoor trigger pixel value in normalized space, either a
+                       scalar or one value per channel
+                       If None, uses a white pixel under Normalize(mean, std)
+        mean, std: Per-channel normalization of the batches, used to build the
+                   default trigger value. If neither trigger_value nor mean/std
+                   is given, the trigger is a white pixel under MNIST
+                   normalization, so other datasets (e.g. CIFAR-10) must pass
+                   one of them
+        trigger_size: Side length of the square trigger patch in the bottom right corner
+        target_class: Class attacked by the targeted attack
+        target_output: Incorrect output produced by the targeted attack
+        
+    Returns:
+        A collate function to pass as collate_fn= to a DataLoader
+    """
+    if trigger_value is None:
+        trigger_value = MNIST_WHITE if mean is None else _white_value(mean, std)
+    elif not isinstance(trigger_value, (int, float)):
+        trigger_value = _white_value_tensor(trigger_value)
+    
+    if attack_type == 'label_flipping':
+        def collate(batch):
+            data, targets = default_collate(batch)
+            return data, num_classes - 1 - targets
+    elif attack_type == 'backdoor':
+        def collate(batch):
+            data, targets = default_collate(batch)
+            # Bottom right corner of whatever image shape the batch has
+            data[:, :, -trigger_size:, -trigger_size:] = trigger_value
+            targets.fill_(target_label)
+            return data, targets
+    elif attack_type == 'min_max':
+        def collate(batch):
+            data, targets = default_collate(batch)
+            return data, (targets + 1) % num_classes
+    elif attack_type == 'targeted':
+        def collate(batch):
+            data, targets = default_collate(batch)
+            targets[targets == target_class] = target_output
+            return data, targets
+    else:
+        print(f"Warning: Unknown attack type '{attack_type}'. Using default collate.")
+        return default_collate
+    
+    return collate
+
+def _get_all_labels(dataset):
+    """
+    Get the labels of every sample in a dataset as a numpy array.
+    
+    Reads the label attribute of the underlying dataset (`targets` for
+    MNIST/CIFAR-10, `labels` for the Alzheimer dataset) instead of iterating
+    the dataset, which would decode and transform every image. Subsets are
+    unwrapped recursively. Falls back to iterating the dataset when no label
+    attribute is available.
+    
+    Args:
+        dataset: The dataset to read labels from
+        
+    Returns:
+        numpy array of shape (len(dataset),) with integer labels
+    """
+    if isinstance(dataset, torch.utils.data.Subset):
+        return _get_all_labels(dataset.dataset)[np.asarray(dataset.indices, dtype=np.int64)]
+    if isinstance(dataset, torch.utils.data.TensorDataset):
+        return np.asarray(dataset.tensors[1], dtype=np.int64)
+    for attr in ('targets', 'labels'):
+        if hasattr(dataset, attr):
+            return np.asarray(getattr(dataset, attr), dtype=np.int64)
+    return np.array([int(label) for _, label in dataset], dtype=np.int64)
 
 def load_dataset():
     """Load and prepare the dataset based on configuration."""
@@ -238,7 +500,7 @@ def load_dataset():
         # Define transformations
         transform = transforms.Compose([
             transforms.ToTensor(),
-            transforms.Normalize((0.1307,), (0.3081,))
+            transforms.Normalize(MNIST_MEAN, MNIST_STD)
         ])
         
         try:
@@ -285,6 +547,10 @@ def load_dataset():
             
             num_classes = 10
             input_channels = 1
+        
+        # Keep MNIST in memory as raw uint8 so item access skips the PIL transform
+        train_dataset = _mnist_to_in_memory(train_dataset)
+        test_dataset = _mnist_to_in_memory(test_dataset)
             
     elif DATASET == 'ALZHEIMER':
         train_dataset, test_dataset, num_classes, input_channels = load_alzheimer_dataset()
@@ -298,23 +564,73 @@ def load_dataset():
     
     return train_dataset, test_dataset, num_classes, input_channels
 
+def _assign_label_skew_clients(labels, u, pref_draw, other_draw,
+                               pref_lut, pref_counts, other_lut, other_counts, q,
+                               use_numba=None):
+    """
+    Choose a client for every sample of the label skew split.
+    
+    Sample i goes to a random preferred client of its class with probability q
+    (u[i] < q), otherwise to a random non-preferred client. Classes with no
+    non-preferred clients always use a preferred one.
+    
+    Args:
+        labels: Class of each sample
+        u: Uniform [0, 1) draws deciding preferred vs non-preferred
+        pref_draw, other_draw: Non-negative random integers picking the client
+        pref_lut, other_lut: (num_classes, NUM_CLIENTS) client lookup tables
+        pref_counts, other_counts: Number of valid entries per row of the tables
+        q: Probability of assigning a sample to a preferred client
+        use_numba: Use the numba JIT loop instead of NumPy. If None, uses USE_NUMBA
+        
+    Returns:
+        numpy array with the chosen client of each sample
+    """
+    if use_numba is None:
+        use_numba = USE_NUMBA
+    if use_numba and HAS_NUMBA:
+        return _label_skew_jit()(labels, u, pref_draw, other_draw,
+                                 pref_lut, pref_counts, other_lut, other_counts, q)
+    use_pref = (u < q) | (other_counts[labels] == 0)
+    pref = pref_lut[labels, pref_draw % pref_counts[labels]]
+    other = other_lut[labels, other_draw % np.maximum(other_counts[labels], 1)]
+    return np.where(use_pref, pref, other)
+
+def _assign_label_skew_clients_loop(labels, u, pref_draw, other_draw,
+                                    pref_lut, pref_counts, other_lut, other_counts, q):
+    # Per-sample loop version of _assign_label_skew_clients, compiled by numba
+    n = labels.shape[0]
+    out = np.empty(n, dtype=np.int64)
+    for i in range(n):
+        c = labels[i]
+        if u[i] < q or other_counts[c] == 0:
+            out[i] = pref_lut[c, pref_draw[i] % pref_counts[c]]
+        else:
+            out[i] = other_lut[c, other_draw[i] % other_counts[c]]
+    return out
+
+_LABEL_SKEW_JIT = None
+
+def _label_skew_jit():
+    """Compile _assign_label_skew_clients_loop with numba on first use"""
+    global _LABEL_SKEW_JIT
+    if _LABEL_SKEW_JIT is None:
+        from numba import njit
+        _LABEL_SKEW_JIT = njit(cache=True)(_assign_label_skew_clients_loop)
+    return _LABEL_SKEW_JIT
+
 def split_dataset_non_iid(dataset, num_classes):
     """
     Non-IID (Label Skew): Clients have data biased towards certain classes.
     Uses the label skew approach to create non-IID distribution.
     Works with any number of classes and clients.
     """
-    # Initialize empty list for each client
-    client_datasets = [[] for _ in range(NUM_CLIENTS)]
-    
-    # Group indices by class
-    class_indices = [[] for _ in range(num_classes)]
-    for idx, (_, label) in enumerate(dataset):
-        class_indices[label].append(idx)
+    # RANDOM_SEED=None gives a fresh, non-deterministic split
+    rng = np.random.default_rng(RANDOM_SEED)
     
-    # Shuffle indices within each class
-    for c in range(num_classes):
-        random.shuffle(class_indices[c])
+    # Group indices by class and shuffle indices within each class
+    labels = _get_all_labels(dataset)
+    class_indices = [rng.permutation(np.flatnonzero(labels == c)) for c in range(num_classes)]
     
     # Handle both cases: more clients than classes or more classes than clients
     if NUM_CLIENTS <= num_classes:
@@ -326,37 +642,44 @@ def split_dataset_non_iid(dataset, num_classes):
         classes_per_client = max(1, num_classes // NUM_CLIENTS)  # At least 1 class per client
         clients_per_class = 1
     
-    # Create a mapping of classes to their "preferred" clients
-    class_to_clients = {}
+    # Create a (class, client) mask of each class's "preferred" clients
+    pref_mask = np.zeros((num_classes, NUM_CLIENTS), dtype=bool)
     for c in range(num_classes):
         # Calculate start and end indices for clients that prefer this class
         start_client = (c * clients_per_class) % NUM_CLIENTS
         end_client = min(start_client + clients_per_class, NUM_CLIENTS)
         
         # Assign these clients to the class
-        class_to_clients[c] = list(range(start_client, end_client))
-        if not class_to_clients[c]:  # Ensure each class has at least one client
-            class_to_clients[c] = [c % NUM_CLIENTS]
-    
-    # Distribute class samples according to Q parameter
-    for c in range(num_classes):
-        preferred_clients = class_to_clients[c]
-        other_clients = [i for i in range(NUM_CLIENTS) if i not in preferred_clients]
-        
-        for idx in class_indices[c]:
-            if random.random() < Q:
-                # Assign to a preferred client for this class
-                client_id = random.choice(preferred_clients)
-            else:
-                # Assign to a non-preferred client
-                if other_clients:
-                    client_id = random.choice(other_clients)
-                else:
-                    # If no other clients, assign to a preferred one
-                    client_id = random.choice(preferred_clients)
-            
-            # Add the index to the chosen client's dataset
-            client_datasets[client_id].append(idx)
+        pref_mask[c, start_client:end_client] = True
+        if not pref_mask[c].any():  # Ensure each class has at least one client
+            pref_mask[c, c % NUM_CLIENTS] = True
+    
+    # Build per-class lookup tables of preferred / non-preferred clients: a stable
+    # sort on the mask lists the selected clients first, in ascending order
+    # (the valid length of each row is stored per class)
+    pref_lut = np.argsort(~pref_mask, axis=1, kind='stable')
+    other_lut = np.argsort(pref_mask, axis=1, kind='stable')
+    pref_counts = pref_mask.sum(axis=1)
+    other_counts = NUM_CLIENTS - pref_counts
+    
+    # Distribute class samples according to Q parameter.
+    # All random draws are made up front and the per-sample choice runs in
+    # _assign_label_skew_clients (JIT-compiled with numba if USE_NUMBA is set).
+    assigned_indices = np.concatenate(class_indices).astype(np.int64)
+    assigned_labels = np.repeat(np.arange(num_classes), [len(indices) for indices in class_indices])
+    n = len(assigned_indices)
+    u = rng.random(n)
+    pref_draw = rng.integers(0, 2**31 - 1, size=n)
+    other_draw = rng.integers(0, 2**31 - 1, size=n)
+    assigned_clients = _assign_label_skew_clients(
+        assigned_labels, u, pref_draw, other_draw,
+        pref_lut, pref_counts, other_lut, other_counts, Q
+    )
+    
+    # Bucket the indices by chosen client (stable sort keeps the per-class order)
+    order = np.argsort(assigned_clients, kind='stable')
+    client_sizes = np.bincount(assigned_clients, minlength=NUM_CLIENTS)
+    client_datasets = [indices.tolist() for indices in np.split(assigned_indices[order], np.cumsum(client_sizes)[:-1])]
     
     # Convert to PyTorch Subset format
     client_datasets = [torch.utils.data.Subset(dataset, indices) for indices in client_datasets]
@@ -365,8 +688,8 @@ def split_dataset_non_iid(dataset, num_classes):
     print("\n=== Data Distribution Statistics ===")
     print(f"Distribution Type: Non-IID (Label Skew) with Q={Q}")
     for i, client_dataset in enumerate(client_datasets):
-        labels = [dataset[idx][1] for idx in client_dataset.indices]
-        label_counts = {c: labels.count(c) for c in range(num_classes)}
+        counts = np.bincount(labels[client_dataset.indices], minlength=num_classes)
+        label_counts = dict(enumerate(counts.tolist()))
         print(f"Client {i}: {len(client_dataset)} samples, Label distribution: {label_counts}")
     
     return client_datasets
@@ -407,52 +730,35 @@ def split_dataset_dirichlet(dataset, num_classes, alpha=None):
     if alpha is None:
         alpha = DIRICHLET_ALPHA
         
-    # Get indices for each class
-    class_indices = [[] for _ in range(num_classes)]
-    for idx, (_, label) in enumerate(dataset):
-        class_indices[label].append(idx)
+    # RANDOM_SEED=None gives a fresh, non-deterministic split
+    rng = np.random.default_rng(RANDOM_SEED)
     
-    # Shuffle indices within each class
-    for c in range(num_classes):
-        random.shuffle(class_indices[c])
-    
-    # Initialize client datasets
-    client_datasets = [[] for _ in range(NUM_CLIENTS)]
+    # Get indices for each class and shuffle indices within each class
+    labels = _get_all_labels(dataset)
+    class_indices = [rng.permutation(np.flatnonzero(labels == c)) for c in range(num_classes)]
     
-    # Sample from Dirichlet distribution for each client
-    proportions = np.random.dirichlet(np.repeat(alpha, NUM_CLIENTS), num_classes)
+    # Sample from Dirichlet distribution for each client (all classes in one call)
+    proportions = rng.dirichlet(np.full(NUM_CLIENTS, alpha), size=num_classes)
     
     # Calculate the number of samples from each class for each client
-    class_samples_per_client = np.zeros((num_classes, NUM_CLIENTS), dtype=int)
-    for c in range(num_classes):
-        class_size = len(class_indices[c])
-        samples_per_client = np.floor(proportions[c] * class_size).astype(int)
-        
-        # Adjust to ensure all samples are distributed
-        remainder = class_size - samples_per_client.sum()
-        if remainder > 0:
-            # Add the remaining samples to clients with highest proportions
-            indices = np.argsort(proportions[c])[-remainder:]
-            for idx in indices:
-                samples_per_client[idx] += 1
-        
-        class_samples_per_client[c] = samples_per_client
-    
-    # Distribute class samples to clients
-    start_idxs = np.zeros(num_classes, dtype=int)
-    for client_idx in range(NUM_CLIENTS):
-        for class_idx in range(num_classes):
-            samples_count = class_samples_per_client[class_idx][client_idx]
-            start_idx = start_idxs[class_idx]
-            end_idx = start_idx + samples_count
-            
-            # Get indices for this class and client
-            if start_idx < len(class_indices[class_idx]):
-                client_class_indices = class_indices[class_idx][start_idx:end_idx]
-                client_datasets[client_idx].extend(client_class_indices)
-            
-            # Update the starting index for next allocation
-            start_idxs[class_idx] = end_idx
+    class_sizes = np.array([len(indices) for indices in class_indices])
+    class_samples_per_client = np.floor(proportions * class_sizes[:, None]).astype(int)
+    
+    # Adjust to ensure all samples are distributed: add the remaining samples
+    # of each class to the clients with the highest proportions
+    remainders = class_sizes - class_samples_per_client.sum(axis=1)
+    client_ranks = np.argsort(np.argsort(-proportions, axis=1, kind='stable'), axis=1)
+    class_samples_per_client += client_ranks < remainders[:, None]
+    
+    # Distribute class samples to clients in one vectorized pass:
+    # lay out all (shuffled) class indices class by class, tag each position with
+    # its owning client, then bucket by client with a stable sort so that each
+    # client's indices stay grouped by class
+    flat_indices = np.concatenate([np.asarray(indices, dtype=np.int64) for indices in class_indices])
+    owners = np.repeat(np.tile(np.arange(NUM_CLIENTS), num_classes), class_samples_per_client.ravel())
+    order = np.argsort(owners, kind='stable')
+    client_sizes = class_samples_per_client.sum(axis=0)
+    client_datasets = [indices.tolist() for indices in np.split(flat_indices[order], np.cumsum(client_sizes)[:-1])]
     
     # Convert to PyTorch Subset format
     client_datasets = [torch.utils.data.Subset(dataset, indices) for indices in client_datasets]
@@ -502,16 +808,22 @@ def create_root_dataset(full_dataset, num_classes):
         root_size = ROOT_DATASET_SIZE
         print(f"Using fixed root dataset size: {root_size} samples")
     
+    # Split indices into biased/unbiased classes in one vectorized pass over the labels
+    labels = _get_all_labels(full_dataset)
+    biased_mask = labels == BIAS_CLASS
+    biased_indices = np.flatnonzero(biased_mask)
+    rng = np.random.default_rng(RANDOM_SEED)
+    
     if BIAS_PROBABILITY == 1.0:
-        biased_indices = [i for i, (_, label) in enumerate(full_dataset) if label == BIAS_CLASS]
-        root_indices = random.sample(biased_indices, min(root_size, len(biased_indices)))
+        root_indices = rng.choice(biased_indices, min(root_size, len(biased_indices)), replace=False).tolist()
     else:
         biased_size = int(root_size * BIAS_PROBABILITY)
         unbiased_size = root_size - biased_size
-        biased_indices = [i for i, (_, label) in enumerate(full_dataset) if label == BIAS_CLASS]
-        unbiased_indices = [i for i, (_, label) in enumerate(full_dataset) if label != BIAS_CLASS]
-        root_indices = random.sample(biased_indices, min(biased_size, len(biased_indices))) + \
-                       random.sample(unbiased_indices, min(unbiased_size, len(unbiased_indices)))
+        unbiased_indices = np.flatnonzero(~biased_mask)
+        root_indices = np.concatenate([
+            rng.choice(biased_indices, min(biased_size, len(biased_indices)), replace=False),
+            rng.choice(unbiased_indices, min(unbiased_size, len(unbiased_indices)), replace=False)
+        ]).tolist()
     
     root_dataset = torch.utils.data.Subset(full_dataset, root_indices)
     return root_dataset 
\ No newline at end of file
@@ -0,0 +1,229 @@
+"""
+In-memory tensor datasets with batched (vectorized) transforms.
+"""
+
+import importlib.util
+import torch
+import torch.nn.functional as F
+from torch.utils.data import Dataset, IterableDataset, Subset, get_worker_info
+
+# Optional: kornia for batched augmentation / normalization of GPU batches.
+# Imported on first use since importing it is slow
+HAS_KORNIA = importlib.util.find_spec("kornia") is not None
+
+def normalize_batch(batch, mean, std, dtype=torch.float32):
+    """
+    Convert a uint8 image batch to normalized floating point in one fused pass.
+    
+    Args:
+        batch: uint8 tensor of shape (B, C, H, W) or (C, H, W)
+        mean: Per-channel means (in [0, 1] pixel units)
+        std: Per-channel standard deviations
+        dtype: Output dtype (e.g. torch.bfloat16 for reduced-precision models)
+        
+    Returns:
+        Normalized tensor of the requested dtype
+    """
+    mean = torch.as_tensor(mean, dtype=torch.float32, device=batch.device).view(-1, 1, 1)
+    std = torch.as_tensor(std, dtype=torch.float32, device=batch.device).view(-1, 1, 1)
+    # Out-of-place first step: .to() returns the caller's tensor if it is already float32
+    batch = batch.to(torch.float32, non_blocking=True).div(255).sub_(mean).div_(std)
+    return batch if dtype == torch.float32 else batch.to(dtype)
+
+def _random_crop_flip(batch, padding=4):
+    """
+    Random crop with zero padding and random horizontal flip, vectorized over a batch.
+    
+    Pure torch equivalent of RandomCrop(H, padding) + RandomHorizontalFlip().
+    """
+    B, C, H, W = batch.shape
+    padded = F.pad(batch, (padding, padding, padding, padding))
+    if B == 1:
+        # Single image: a plain slice is cheaper than the batched gather
+        oy, ox = torch.randint(0, 2 * padding + 1, (2,)).tolist()
+        cropped = padded[:, :, oy:oy + H, ox:ox + W]
+        return cropped.flip(-1) if torch.rand(()) < 0.5 else cropped
+    # Per-sample crop offsets, gathered with a single advanced index
+    oy = torch.randint(0, 2 * padding + 1, (B,), device=batch.device)
+    ox = torch.randint(0, 2 * padding + 1, (B,), device=batch.device)
+    rows = (oy[:, None] + torch.arange(H, device=batch.device))[:, None, :, None]
+    cols = (ox[:, None] + torch.arange(W, device=batch.device))[:, None, None, :]
+    batch_idx = torch.arange(B, device=batch.device)[:, None, None, None]
+    channel_idx = torch.arange(C, device=batch.device)[None, :, None, None]
+    cropped = padded[batch_idx, channel_idx, rows, cols]
+    # Flip half of the samples
+    flip = torch.rand(B, device=batch.device) < 0.5
+    return torch.where(flip[:, None, None, None], cropped.flip(-1), cropped)
+
+# Kornia augmentation pipelines, built once per image size
+_KORNIA_AUGMENT = {}
+
+def _kornia_augment(H, W):
+    """Return the cached kornia random crop + horizontal flip pipeline for (H, W) images."""
+    if (H, W) not in _KORNIA_AUGMENT:
+        import kornia.augmentation as K
+        _KORNIA_AUGMENT[(H, W)] = torch.nn.Sequential(
+            K.RandomCrop((H, W), padding=4),
+            K.RandomHorizontalFlip()
+        )
+    return _KORNIA_AUGMENT[(H, W)]
+
+def apply_batch_transforms(batch, mean, std, augment=False, device=None):
+    """
+    Apply augmentation and normalization to a whole uint8 image batch at once.
+    
+    Replaces per-sample torchvision transforms. Batches on the GPU use kornia
+    when it is installed; CPU batches always use the pure torch implementation,
+    which is faster there. Can be called from a collate_fn or from the training
+    loop right after moving the batch to the GPU (pass device to move it here).
+    
+    Args:
+        batch: uint8 tensor of shape (B, C, H, W)
+        mean: Per-channel means (in [0, 1] pixel units)
+        std: Per-channel standard deviations
+        augment: Whether to apply random crop (padding 4) and horizontal flip
+        device: Optional device to move the batch to before transforming
+        
+    Returns:
+        Normalized float32 tensor of shape (B, C, H, W)
+    """
+    if device is not None:
+        batch = batch.to(device, non_blocking=True)
+    
+    if HAS_KORNIA and batch.is_cuda:
+        import kornia
+        batch = batch.to(torch.float32) / 255
+        if augment:
+            batch = _kornia_augment(*batch.shape[-2:])(batch)
+        mean = torch.as_tensor(mean, dtype=torch.float32, device=batch.device)
+        std = torch.as_tensor(std, dtype=torch.float32, device=batch.device)
+        return kornia.enhance.normalize(batch, mean, std)
+    
+    if augment:
+        batch = _random_crop_flip(batch)
+    return normalize_batch(batch, mean, std)
+
+class InMemoryTensorDataset(Dataset):
+    """
+    Dataset backed by raw uint8 images and a label tensor held in memory.
+    
+    Images are stored unnormalized (4x smaller than float32) and transformed
+    on access; batched access through __getitems__ augments and normalizes
+    the whole batch at once. Exposes `targets` like the torchvision datasets
+    it replaces.
+    """
+    def __init__(self, imgs_u8, targets, mean, std, augment=False):
+        self.imgs_u8 = imgs_u8
+        self.targets = targets
+        self.mean = mean
+        self.std = std
+        self.augment = augment
+
+    def __len__(self):
+        return len(self.targets)
+
+    def __getitem__(self, idx):
+        img = self.imgs_u8[idx].unsqueeze(0)
+        if self.augment:
+            img = _random_crop_flip(img)
+        return normalize_batch(img[0], self.mean, self.std), int(self.targets[idx])
+
+    def __getitems__(self, idxs):
+        # Gather and transform the whole batch with single tensor operations
+        idxs = torch.as_tensor(idxs, dtype=torch.long)
+        imgs = apply_batch_transforms(self.imgs_u8[idxs], self.mean, self.std, self.augment)
+        return list(zip(imgs, self.targets[idxs].tolist()))
+
+class ContiguousBatchDataset(IterableDataset):
+    """
+    Iterable dataset that yields whole batches read as contiguous blocks.
+    
+    Instead of gathering B random indices per batch, the underlying tensors
+    are permuted once per epoch and each batch is a single slice, i.e. one
+    memcpy of B images. Meant for small in-memory images (MNIST, CIFAR-10):
+    iterate it directly or wrap it in DataLoader(dataset, batch_size=None).
+    With DataLoader workers, every worker applies the same per-epoch
+    permutation and yields only its own share of the batches. Note that
+    shuffle_ then makes a full copy of imgs_u8 in every worker each epoch, so
+    the tensors are no longer shared with the main process (use shuffle=False
+    or few workers for large datasets).
+    """
+    def __init__(self, dataset, batch_size, shuffle=True, drop_last=False):
+        """
+        Args:
+            dataset: An InMemoryTensorDataset
+            batch_size: Number of samples per batch
+            shuffle: Whether to permute the data at the start of every epoch
+            drop_last: Whether to drop the last incomplete batch
+        """
+        self.imgs_u8 = dataset.imgs_u8
+        self.targets = dataset.targets
+        self.mean = dataset.mean
+        self.std = dataset.std
+        self.augment = dataset.augment
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.drop_last = drop_last
+        self.epoch = 0
+
+    @classmethod
+    def from_subset(cls, subset, batch_size, shuffle=True, drop_last=False):
+        """
+        Gather a client's Subset of an InMemoryTensorDataset into contiguous tensors once.
+        
+        Args:
+            subset: A Subset (e.g. from split_dataset) of an InMemoryTensorDataset
+            batch_size, shuffle, drop_last: See __init__
+            
+        Returns:
+            A ContiguousBatchDataset over only the subset's samples
+        """
+        if not isinstance(subset, Subset) or not isinstance(subset.dataset, InMemoryTensorDataset):
+            raise ValueError("from_subset expects a Subset of an InMemoryTensorDataset")
+        base = subset.dataset
+        indices = torch.as_tensor(subset.indices, dtype=torch.long)
+        client_dataset = InMemoryTensorDataset(
+            base.imgs_u8[indices].contiguous(),
+            base.targets[indices].contiguous(),
+            base.mean,
+            base.std,
+            augment=base.augment
+        )
+        return cls(client_dataset, batch_size, shuffle=shuffle, drop_last=drop_last)
+
+    def __len__(self):
+        num_samples = len(self.targets)
+        if self.drop_last:
+            return num_samples // self.batch_size
+        return (num_samples + self.batch_size - 1) // self.batch_size
+
+    def shuffle_(self, generator=None):
+        """Permute the stored samples once so batches can be read contiguously."""
+        perm = torch.randperm(len(self.targets), generator=generator)
+        self.imgs_u8 = self.imgs_u8[perm]
+        self.targets = self.targets[perm]
+
+    def get_batch(self, start, stop):
+        """Return the transformed samples in [start, stop) as (data, targets) batch tensors."""
+        imgs = apply_batch_transforms(self.imgs_u8[start:stop], self.mean, self.std, self.augment)
+        return imgs, self.targets[start:stop]
+
+    def __iter__(self):
+        worker_info = get_worker_info()
+        if worker_info is None:
+            worker_id, num_workers, generator = 0, 1, None
+        else:
+            # All workers must permute identically: seed from the DataLoader's
+            # per-epoch base seed (shared by all workers) and the local epoch count
+            worker_id, num_workers = worker_info.id, worker_info.num_workers
+            base_seed = worker_info.seed - worker_info.id
+            generator = torch.Generator().manual_seed((base_seed + self.epoch) % 2**63)
+        self.epoch += 1
+        
+        if self.shuffle:
+            self.shuffle_(generator)
+        num_samples = len(self.targets)
+        # Each worker yields every num_workers-th batch
+        for i in range(worker_id, len(self), num_workers):
+            start = i * self.batch_size
+            yield self.get_batch(start, min(start + self.batch_size, num_samples))
@@ -0,0 +1,228 @@
+import random
+import torch
+import numpy as np
+from torch.utils.data import TensorDataset, DataLoader, Subset
+from federated_learning.data.dataset import (
+    MinSumAttackDataset,
+    LabelFlippingDataset,
+    MinMaxAttackDataset,
+    AlternatingAttackDataset,
+    TargetedAttackDataset,
+    GradientInversionAttackDataset,
+    split_dataset_non_iid,
+    split_dataset_dirichlet,
+    _get_all_labels,
+    RANDOM_SEED,
+    _assign_label_skew_clients,
+    _assign_label_skew_clients_loop,
+    HAS_NUMBA
+)
+from federated_learning.data.in_memory_dataset import InMemoryTensorDataset, ContiguousBatchDataset
+
+def test_alias_sampling():
+    """Test that MinSumAttackDataset's alias sampler matches prob_map"""
+    print("Testing MinSum alias sampling...")
+
+    num_classes = 10
+    num_draws = 100000
+
+    for target in [0, 3, 9]:
+        # Single-sample dataset: every draw samples a new label for the same target
+        dataset = TensorDataset(torch.zeros(1, 1), torch.tensor([target]))
+        attack_dataset = MinSumAttackDataset(dataset, num_classes)
+
+        draws = [attack_dataset[0][1] for _ in range(num_draws)]
+        empirical = np.bincount(draws, minlength=num_classes) / num_draws
+        expected = attack_dataset.prob_map[target].numpy()
+        max_error = np.abs(empirical - expected).max()
+
+        print(f"Target {target}: max deviation from prob_map = {max_error:.4f}")
+        assert max_error < 0.01, f"Alias sampler deviates from prob_map for target {target}"
+
+    print("Alias sampling test passed")
+
+def test_label_remap_batching():
+    """Test that __getitems__ and __getitem__ give the same labels for every remap attack"""
+    print("Testing batched label remapping...")
+
+    num_classes = 10
+    num_samples = 101
+    dataset = TensorDataset(torch.randn(num_samples, 1, 28, 28), torch.randint(0, num_classes, (num_samples,)))
+    indices = list(range(num_samples))
+
+    attack_classes = [
+        LabelFlippingDataset,
+        MinMaxAttackDataset,
+        AlternatingAttackDataset,
+        TargetedAttackDataset,
+        GradientInversionAttackDataset
+    ]
+
+    for attack_class in attack_classes:
+        attack_dataset = attack_class(dataset, num_classes)
+        single_labels = [attack_dataset[idx][1] for idx in indices]
+        batch_labels = [label for _, label in attack_dataset.__getitems__(indices)]
+
+        print(f"{attack_class.__name__}: {sum(a == b for a, b in zip(single_labels, batch_labels))}/{num_samples} labels match")
+        assert single_labels == batch_labels, f"{attack_class.__name__}: __getitems__ disagrees with __getitem__"
+
+    print("Batched label remapping test passed")
+
+def test_get_all_labels():
+    """Test that _get_all_labels matches the labels returned by iterating the dataset"""
+    print("Testing label lookup...")
+
+    num_classes = 10
+    num_samples = 200
+    targets = torch.randint(0, num_classes, (num_samples,))
+    tensor_dataset = TensorDataset(torch.randn(num_samples, 1), targets)
+    in_memory_dataset = InMemoryTensorDataset(
+        torch.zeros(num_samples, 1, 4, 4, dtype=torch.uint8), targets, (0.5,), (0.5,)
+    )
+    subset_indices = torch.randperm(num_samples)[:50].tolist()
+
+    datasets = {
+        'TensorDataset': tensor_dataset,
+        'InMemoryTensorDataset': in_memory_dataset,
+        'nested Subset': Subset(Subset(in_memory_dataset, subset_indices), list(range(0, 50, 3))),
+        # Plain list of samples, without a label attribute
+        'fallback': [(torch.zeros(1), int(label)) for label in targets[:20]]
+    }
+
+    for name, dataset in datasets.items():
+        expected = [int(label) for _, label in dataset]
+        labels = _get_all_labels(dataset)
+        print(f"{name}: {len(labels)} labels")
+        assert labels.tolist() == expected, f"_get_all_labels disagrees with iteration for {name}"
+
+    print("Label lookup test passed")
+
+def _check_split_coverage(split_fn, num_classes=10, num_samples=2000):
+    """Split a random dataset with split_fn and check every index is assigned exactly once"""
+    dataset = TensorDataset(torch.randn(num_samples, 1), torch.randint(0, num_classes, (num_samples,)))
+    client_datasets = split_fn(dataset, num_classes)
+    all_indices = sorted(idx for client_dataset in client_datasets for idx in client_dataset.indices)
+
+    print(f"{split_fn.__name__}: client sizes {[len(client_dataset) for client_dataset in client_datasets]}")
+    assert all_indices == list(range(num_samples)), f"{split_fn.__name__} does not cover every index exactly once"
+
+def test_dirichlet_split_coverage():
+    """Test that the vectorized Dirichlet split assigns every index exactly once"""
+    print("Testing Dirichlet split coverage...")
+    _check_split_coverage(split_dataset_dirichlet)
+    print("Dirichlet split coverage test passed")
+
+def _check_split_reproducible(split_fn, num_classes=10, num_samples=2000):
+    """Check that split_fn gives the same split twice, whatever the global RNG state"""
+    dataset = TensorDataset(torch.randn(num_samples, 1), torch.randint(0, num_classes, (num_samples,)))
+    splits = []
+    for global_seed in [0, 1]:
+        # The split must only depend on RANDOM_SEED
+        random.seed(global_seed)
+        np.random.seed(global_seed)
+        torch.manual_seed(global_seed)
+        splits.append([client_dataset.indices for client_dataset in split_fn(dataset, num_classes)])
+    assert splits[0] == splits[1], f"{split_fn.__name__} is not reproducible for RANDOM_SEED={RANDOM_SEED}"
+
+def test_dirichlet_split_reproducible():
+    """Test that the Dirichlet split is fully determined by RANDOM_SEED"""
+    print("Testing Dirichlet split reproducibility...")
+    if RANDOM_SEED is None:
+        print("RANDOM_SEED is None, skipping")
+        return
+    _check_split_reproducible(split_dataset_dirichlet)
+    print("Dirichlet split reproducibility test passed")
+
+def test_label_skew_split_coverage():
+    """Test that the batched label skew split assigns every index exactly once"""
+    print("Testing label skew split coverage...")
+    _check_split_coverage(split_dataset_non_iid)
+    print("Label skew split coverage test passed")
+
+def test_label_skew_split_reproducible():
+    """Test that the label skew split is fully determined by RANDOM_SEED"""
+    print("Testing label skew split reproducibility...")
+    if RANDOM_SEED is None:
+        print("RANDOM_SEED is None, skipping")
+        return
+    _check_split_reproducible(split_dataset_non_iid)
+    print("Label skew split reproducibility test passed")
+
+def test_label_skew_numba():
+    """Test that the NumPy and numba label skew assignments agree"""
+    print("Testing label skew NumPy vs numba assignment...")
+
+    num_classes = 10
+    num_clients = 5
+    n = 60000
+    rng = np.random.default_rng(0)
+
+    # Mix of classes with several, one and no non-preferred clients
+    pref_mask = rng.random((num_classes, num_clients)) < 0.4
+    pref_mask[0] = True
+    pref_mask[np.arange(num_classes), np.arange(num_classes) % num_clients] = True
+    pref_lut = np.argsort(~pref_mask, axis=1, kind='stable')
+    other_lut = np.argsort(pref_mask, axis=1, kind='stable')
+    pref_counts = pref_mask.sum(axis=1)
+    other_counts = num_clients - pref_counts
+
+    args = (rng.integers(0, num_classes, size=n), rng.random(n),
+            rng.integers(0, 2**31 - 1, size=n), rng.integers(0, 2**31 - 1, size=n),
+            pref_lut, pref_counts, other_lut, other_counts, 0.5)
+
+    numpy_clients = _assign_label_skew_clients(*args, use_numba=False)
+    loop_clients = _assign_label_skew_clients_loop(*args)
+    assert np.array_equal(numpy_clients, loop_clients), "NumPy assignment disagrees with the per-sample loop"
+
+    if HAS_NUMBA:
+        numba_clients = _assign_label_skew_clients(*args, use_numba=True)
+        assert np.array_equal(numpy_clients, numba_clients), "NumPy assignment disagrees with numba"
+    else:
+        print("numba not installed, only checked the pure Python loop")
+
+    print("Label skew NumPy vs numba test passed")
+
+def test_contiguous_batch_workers():
+    """Test that ContiguousBatchDataset yields every sample once per epoch with DataLoader workers"""
+    print("Testing ContiguousBatchDataset with DataLoader workers...")
+
+    num_samples = 103
+    # Use the target as a sample id
+    dataset = InMemoryTensorDataset(
+        torch.zeros(num_samples, 1, 4, 4, dtype=torch.uint8),
+        torch.arange(num_samples),
+        (0.5,),
+        (0.5,)
+    )
+
+    for persistent_workers in [False, True]:
+        contiguous_dataset = ContiguousBatchDataset(dataset, batch_size=10, shuffle=True)
+        loader = DataLoader(contiguous_dataset, batch_size=None, num_workers=2,
+                            persistent_workers=persistent_workers)
+
+        epoch_orders = []
+        for epoch in range(2):
+            seen = torch.cat([targets for _, targets in loader]).tolist()
+            print(f"persistent_workers={persistent_workers}, epoch {epoch}: {len(seen)} samples")
+            assert sorted(seen) == list(range(num_samples)), "Samples are missing or repeated within an epoch"
+            epoch_orders.append(seen)
+        assert epoch_orders[0] != epoch_orders[1], "Epochs use the same permutation"
+
+    print("ContiguousBatchDataset worker test passed")
+
+if __name__ == "__main__":
+    # Set random seed for reproducibility
+    random.seed(42)
+    torch.manual_seed(42)
+    np.random.seed(42)
+
+    # Run the tests
+    test_alias_sampling()
+    test_label_remap_batching()
+    test_get_all_labels()
+    test_dirichlet_split_coverage()
+    test_dirichlet_split_reproducible()
+    test_label_skew_split_coverage()
+    test_label_skew_split_reproducible()
+    test_label_skew_numba()
+    test_contiguous_batch_workers()